@@ -1,4 +1,6 @@
 import flask
+import functools
+import gevent
 from src.relation_engine_server.utils import (
     json_validation,
     arango_client,
@@ -14,20 +16,25 @@ from src.relation_engine_server.exceptions import InvalidParameters
 
 api_v1 = flask.Blueprint('api_v1', __name__)
 
+# HTTP methods shared by the route definitions below
+_GET = frozenset({'GET'})
+_POST = frozenset({'POST'})
+_PUT = frozenset({'PUT'})
 
-@api_v1.route("/data_sources", methods=["GET"])
+
+@api_v1.route("/data_sources", methods=_GET)
 def list_data_sources():
     data_sources = load_data_sources.list_all()
     return flask.jsonify({'data_sources': data_sources})
 
 
-@api_v1.route("/data_sources/<name>", methods=["GET"])
+@api_v1.route("/data_sources/<name>", methods=_GET)
 def show_data_source(name):
     data_source = load_data_sources.fetch_one(name)
     return flask.jsonify({'data_source': data_source})
 
 
-@api_v1.route('/specs/stored_queries', methods=['GET'])
+@api_v1.route('/specs/stored_queries', methods=_GET)
 def show_stored_queries():
     """Show the current stored query names loaded from the spec."""
     name = flask.request.args.get('name')
@@ -36,7 +43,7 @@ def show_stored_queries():
     return flask.jsonify(spec_loader.get_stored_query_names())
 
 
-@api_v1.route('/specs/schemas', methods=['GET'])
+@api_v1.route('/specs/schemas', methods=_GET)
 def show_schemas():
     """Show the current schema names (edges and vertices) loaded from the spec."""
     name = flask.request.args.get('name')
@@ -49,7 +56,7 @@ def show_schemas():
         return flask.jsonify(spec_loader.get_schema_names())
 
 
-@api_v1.route('/query_results', methods=['POST'])
+@api_v1.route('/query_results', methods=_POST)
 def run_query():
     """
     Run a stored query as a query against the database.
@@ -58,52 +65,18 @@ def run_query():
      - public stored queries (these have access controls within them based on params)
     """
     json_body = parse_json.get_json_body() or {}
-    # Don't allow the user to set the special 'ws_ids' field
-    json_body['ws_ids'] = []
-    auth_token = auth.get_auth_header()
-    # Fetch any authorized workspace IDs using a KBase auth token, if present
-    ws_ids = auth.get_workspace_ids(auth_token)
-    # fetch number of documents to return
-    batch_size = int(flask.request.args.get('batch_size', 10000))
-    full_count = flask.request.args.get('full_count', False)
     if 'query' in json_body:
-        # Run an adhoc query for a sysadmin
-        auth.require_auth_token(roles=['RE_ADMIN'])
-        query_text = json_body['query']
-        query_text = _preprocess_stored_query(json_body['query'], json_body)
-        del json_body['query']
-        json_body['ws_ids'] = ws_ids
-        resp_body = arango_client.run_query(query_text=query_text,
-                                            bind_vars=json_body,
-                                            batch_size=batch_size,
-                                            full_count=full_count)
-        return flask.jsonify(resp_body)
-    if ('stored_query' in flask.request.args) or ('view' in flask.request.args):
-        # Run a query from a query name
-        # Note: we are maintaining backwards compatibility here with the "view" arg.
-        # "stored_query" is the more accurate name
-        query_name = flask.request.args.get('stored_query') or flask.request.args.get('view')
-        stored_query = spec_loader.get_stored_query(query_name)
-        stored_query_source = _preprocess_stored_query(stored_query['query'], stored_query)
-        if 'params' in stored_query:
-            # Validate the user params for the query
-            json_validation.Validator(stored_query['params']).validate(json_body)
-        json_body['ws_ids'] = ws_ids
-        resp_body = arango_client.run_query(query_text=stored_query_source,
-                                            bind_vars=json_body,
-                                            batch_size=batch_size,
-                                            full_count=full_count)
-        return flask.jsonify(resp_body)
-    if 'cursor_id' in flask.request.args:
-        # Run a query from a cursor ID
-        cursor_id = flask.request.args['cursor_id']
-        resp_body = arango_client.run_query(cursor_id=cursor_id)
-        return flask.jsonify(resp_body)
-    # No valid options were passed
-    raise InvalidParameters('Pass in a query name or a cursor_id')
-
-
-@api_v1.route('/specs', methods=['PUT'])
+        handler = _run_adhoc_query
+    else:
+        handler = next((h for (key, h) in _ARG_QUERY_HANDLERS.items() if key in flask.request.args), None)
+    if handler is None:
+        # No valid options were passed
+        raise InvalidParameters('Pass in a query name or a cursor_id')
+    resp_body = handler(json_body, flask.request.args)
+    return flask.jsonify(resp_body)
+
+
+@api_v1.route('/specs', methods=_PUT)
 def update_specs():
     """
     Manually check for updates, download spec releases, and init new collections.
@@ -113,10 +86,12 @@ def update_specs():
     init_collections = 'init_collections' in flask.request.args
     release_url = flask.request.args.get('release_url')
     pull_spec.download_specs(init_collections, release_url, reset=True)
+    _compile_stored_query.cache_clear()
+    _compile_stored_queries()
     return flask.jsonify({'status': 'updated'})
 
 
-@api_v1.route('/documents', methods=['PUT'])
+@api_v1.route('/documents', methods=_PUT)
 def save_documents():
     """
     Create, update, or replace many documents in a batch.
@@ -139,7 +114,7 @@ def save_documents():
         return flask.jsonify(resp)
 
 
-@api_v1.route('/config', methods=['GET'])
+@api_v1.route('/config', methods=_GET)
 def show_config():
     """Show public config data."""
     conf = config.get_config()
@@ -153,6 +128,139 @@ def show_config():
     })
 
 
+def _run_adhoc_query(json_body, args):
+    """Run an adhoc query for a sysadmin."""
+    query = json_body['query']
+    ws_ids_job = None
+    if isinstance(query, str) and 'ws_ids' in query:
+        # Fetch the workspace IDs in the background while the admin token is checked
+        ws_ids_job = gevent.spawn(_get_workspace_ids_or_error, auth.get_auth_header())
+    try:
+        auth.require_auth_token(roles=['RE_ADMIN'])
+        if not isinstance(query, str):
+            raise InvalidParameters('The query must be a string')
+    except Exception:
+        if ws_ids_job is not None:
+            ws_ids_job.kill()
+        raise
+    query_text = _preprocess_stored_query(json_body['query'], json_body)
+    del json_body['query']
+    ws_ids = ws_ids_job.get() if ws_ids_job is not None else []
+    if isinstance(ws_ids, Exception):
+        raise ws_ids
+    # Don't allow the user to set the special 'ws_ids' field
+    json_body['ws_ids'] = ws_ids
+    return arango_client.run_query(query_text=query_text,
+                                   bind_vars=json_body,
+                                   batch_size=_get_batch_size(args, arango_client.MAX_BATCH_SIZE),
+                                   **_get_cursor_options(args))
+
+
+def _run_stored_query(json_body, args):
+    """Run a query from a query name."""
+    query_name = args.get('stored_query') or args.get('view')
+    compiled = _compile_stored_query(query_name, spec_loader.get_spec_version())
+    # Don't allow the user to set the special 'ws_ids' field
+    json_body['ws_ids'] = _get_workspace_ids(auth.get_auth_header(), compiled['needs_ws_ids'])
+    if compiled['validator']:
+        # Validate the user params for the query
+        compiled['validator'].validate(json_body)
+    return arango_client.run_query(query_text=compiled['query'],
+                                   bind_vars=json_body,
+                                   batch_size=_get_batch_size(args, compiled['default_batch_size']),
+                                   **_get_cursor_options(args))
+
+
+def _run_cursor_query(json_body, args):
+    """Fetch more results from a query cursor ID."""
+    return arango_client.run_query(cursor_id=args['cursor_id'])
+
+
+# Handlers for queries selected by a request arg, in order of precedence
+_ARG_QUERY_HANDLERS = {
+    'stored_query': _run_stored_query,
+    # Note: we are maintaining backwards compatibility here with the "view" arg.
+    # "stored_query" is the more accurate name
+    'view': _run_stored_query,
+    'cursor_id': _run_cursor_query,
+}
+
+
+def _get_cursor_options(args):
+    """Get the options for a new query cursor from the request args."""
+    full_count = args.get('full_count', False)
+    stream = args.get('stream', '').lower() in ('1', 'true')
+    if stream and full_count:
+        raise InvalidParameters('full_count cannot be used with a streaming cursor')
+    return {'full_count': full_count, 'stream': stream}
+
+
+@functools.lru_cache(maxsize=512)
+def _compile_stored_query(name, spec_version):
+    """
+    Load a stored query from the spec, inject its default code, and build a validator
+    for its params, caching the result.
+    Results are keyed on the spec version so that every server worker picks up spec
+    updates, not just the one that handled the update request.
+    """
+    stored_query = spec_loader.get_stored_query(name)
+    validator = None
+    if 'params' in stored_query:
+        validator = json_validation.Validator(stored_query['params'])
+    default_batch_size = stored_query.get('default_batch_size', arango_client.MAX_BATCH_SIZE)
+    if isinstance(default_batch_size, bool) or not isinstance(default_batch_size, int) or default_batch_size < 1:
+        raise ValueError(f"default_batch_size must be a positive integer, got {default_batch_size!r}")
+    return {
+        'query': _preprocess_stored_query(stored_query['query'], stored_query),
+        'validator': validator,
+        'default_batch_size': default_batch_size,
+        'needs_ws_ids': 'ws_ids' in stored_query['query'],
+    }
+
+
+def _get_workspace_ids(auth_token, needed):
+    """
+    Fetch any authorized workspace IDs using a KBase auth token, if present.
+    Skips the workspace request entirely for queries that never use the IDs.
+    """
+    if not needed:
+        return []
+    return auth.get_workspace_ids(auth_token)
+
+
+def _get_workspace_ids_or_error(auth_token):
+    """
+    Fetch the workspace IDs for a token in a background greenlet. Any error is returned
+    rather than raised, so the caller can re-raise it in the request's own greenlet.
+    """
+    try:
+        return auth.get_workspace_ids(auth_token)
+    except Exception as err:
+        return err
+
+
+def _compile_stored_queries():
+    """
+    Compile every stored query in the spec ahead of time so that requests hit the cache.
+    A stored query that fails to compile is skipped; requests for it will raise the error.
+    """
+    spec_version = spec_loader.get_spec_version()
+    for name in spec_loader.get_stored_query_names():
+        try:
+            _compile_stored_query(name, spec_version)
+        except Exception as err:
+            print(f"Unable to compile stored query {name}: {err.__class__.__name__}: {err}")
+
+
+def _get_batch_size(args, default):
+    """Get the number of documents to return per batch, clamped to a sane range."""
+    try:
+        batch_size = int(args.get('batch_size') or default)
+    except ValueError:
+        raise InvalidParameters('batch_size must be an integer')
+    return max(1, min(arango_client.MAX_BATCH_SIZE, batch_size))
+
+
 def _preprocess_stored_query(query_text, config):
     """Inject some default code into each stored query."""
     return (
@@ -161,3 +269,7 @@ def _preprocess_stored_query(query_text, config):
         # " LET maxint = 9007199254740991 " +
         query_text
     )
+
+
+# Compile the stored queries when each server worker starts, rather than on first use
+_compile_stored_queries()
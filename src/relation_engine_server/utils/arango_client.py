@@ -5,18 +5,28 @@ import sys
 import os
 import requests
 import json
+from requests.adapters import HTTPAdapter
 
 from .config import get_config
 
 _CONF = get_config()
 
+# Largest number of results returned in a single cursor batch
+MAX_BATCH_SIZE = 5000
+
+# Keep connections to ArangoDB alive between requests
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(pool_connections=50, pool_maxsize=200)
+_SESSION.mount('http://', _ADAPTER)
+_SESSION.mount('https://', _ADAPTER)
+
 
 def server_status():
     """Get the status of our connection and authorization to the ArangoDB server."""
     auth = (_CONF['db_user'], _CONF['db_pass'])
     adb_url = f"{_CONF['api_url']}/version"
     try:
-        resp = requests.get(adb_url, auth=auth)
+        resp = _SESSION.get(adb_url, auth=auth)
     except requests.exceptions.ConnectionError:
         return 'no_connection'
     if resp.ok:
@@ -27,11 +37,17 @@ def server_status():
         return 'unknown_failure'
 
 
-def run_query(query_text=None, cursor_id=None, bind_vars=None, batch_size=10000, full_count=False):
-    """Run a query using the arangodb http api. Can return a cursor to get more results."""
+def run_query(query_text=None, cursor_id=None, bind_vars=None, batch_size=MAX_BATCH_SIZE, full_count=False,
+              stream=False):
+    """
+    Run a query using the arangodb http api. Can return a cursor to get more results.
+    A streaming cursor computes results lazily as batches are fetched, rather than
+    building the whole result set on the server up front. Streaming cursors cannot
+    count their results, so `count` is None in the response.
+    """
     url = _CONF['api_url'] + '/cursor'
     req_json = {
-        'batchSize': min(5000, batch_size),
+        'batchSize': min(MAX_BATCH_SIZE, batch_size),
         'memoryLimit': 16000000000,  # 16gb
     }
     if cursor_id:
@@ -39,16 +55,19 @@ def run_query(query_text=None, cursor_id=None, bind_vars=None, batch_size=10000,
         url += '/' + cursor_id
     else:
         method = 'POST'
-        req_json['count'] = True
         req_json['query'] = query_text
-        if full_count:
-            req_json['options'] = {'fullCount': True}
+        if stream:
+            req_json['options'] = {'stream': True}
+        else:
+            req_json['count'] = True
+            if full_count:
+                req_json['options'] = {'fullCount': True}
         if bind_vars:
             req_json['bindVars'] = bind_vars
     # Initialize the readonly user
     # _init_readonly_user()
     # Run the query as the readonly user
-    resp = requests.request(
+    resp = _SESSION.request(
         method,
         url,
         data=json.dumps(req_json),
@@ -59,10 +78,10 @@ def run_query(query_text=None, cursor_id=None, bind_vars=None, batch_size=10000,
         raise ArangoServerError(resp.text)
     return {
         'results': resp_json['result'],
-        'count': resp_json['count'],
+        'count': resp_json.get('count'),
         'has_more': resp_json['hasMore'],
         'cursor_id': resp_json.get('id'),
-        'stats': resp_json['extra']['stats']
+        'stats': resp_json.get('extra', {}).get('stats', {})
     }
 
 
@@ -86,7 +105,7 @@ def create_collection(name, config):
         'type': collection_type,
         'numberOfShards': num_shards
     })
-    resp = requests.post(url, data, auth=(_CONF['db_user'], _CONF['db_pass']))
+    resp = _SESSION.post(url, data, auth=(_CONF['db_user'], _CONF['db_pass']))
     resp_json = resp.json()
     if not resp.ok:
         if 'duplicate' not in resp_json['errorMessage']:
@@ -101,7 +120,7 @@ def _create_indexes(coll_name, config):
     url = _CONF['api_url'] + '/index'
     # Fetch existing indexes
     auth = (_CONF['db_user'], _CONF['db_pass'])
-    resp = requests.get(url, params={'collection': coll_name}, auth=auth)
+    resp = _SESSION.get(url, params={'collection': coll_name}, auth=auth)
     if not resp.ok:
         raise RuntimeError(resp.text)
     indexes = resp.json()['indexes']
@@ -111,7 +130,7 @@ def _create_indexes(coll_name, config):
         idx_type = idx_conf['type']
         idx_url = url + '#' + idx_type
         idx_conf['type'] = idx_type
-        resp = requests.post(
+        resp = _SESSION.post(
             idx_url,
             params={'collection': coll_name},
             data=json.dumps(idx_conf),
@@ -137,7 +156,7 @@ def _index_exists(idx_conf, indexes):
 def import_from_file(file_path, query):
     """Import documents from a file."""
     with open(file_path, 'rb') as file_desc:
-        resp = requests.post(
+        resp = _SESSION.post(
             _CONF['api_url'] + '/import',
             data=file_desc,
             auth=(_CONF['db_user'], _CONF['db_pass']),
@@ -169,7 +188,7 @@ def create_view(name, config):
         config['type'] = 'arangosearch'
     print(f"Creating view {name}")
     data = json.dumps(config)
-    resp = requests.post(url, data, auth=(_CONF['db_user'], _CONF['db_pass']))
+    resp = _SESSION.post(url, data, auth=(_CONF['db_user'], _CONF['db_pass']))
     resp_json = resp.json()
     if not resp.ok:
         if 'duplicate' not in resp_json['errorMessage']:
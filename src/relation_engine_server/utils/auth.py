@@ -3,11 +3,32 @@ Authorization and authentication utilities.
 """
 import json
 import flask
+import hashlib
 import requests
+import threading
+import cachetools
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from .config import get_config
 from ..exceptions import MissingHeader, UnauthorizedAccess
 
+# Keep connections to the KBase auth and workspace servers alive between requests
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(pool_connections=20, pool_maxsize=100, max_retries=Retry(total=2, backoff_factor=0.1))
+_SESSION.mount('https://', _ADAPTER)
+_SESSION.mount('http://', _ADAPTER)
+
+# Successful token lookups against the auth server, keyed on a hash of the token
+_TOKEN_CACHE = cachetools.TTLCache(maxsize=1024, ttl=60)  # type: cachetools.TTLCache
+# Workspace IDs readable by each token, keyed on a hash of the token
+_WORKSPACE_IDS_CACHE = cachetools.TTLCache(maxsize=10000, ttl=30)  # type: cachetools.TTLCache
+
+
+def _hash_token(token):
+    """Cache key for an auth token, so that raw tokens are not held in memory."""
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
 
 def require_auth_token(roles=[]):
     """
@@ -22,15 +43,7 @@ def require_auth_token(roles=[]):
         # No authorization token was provided in the headers
         raise MissingHeader('Authorization')
     token = get_auth_header()
-    # Make an authorization request to the kbase auth2 server
-    headers = {'Authorization': token}
-    auth_url = config['auth_url'] + '/api/V2/me'
-    auth_resp = requests.get(auth_url, headers=headers)
-    if not auth_resp.ok:
-        print('-' * 80)
-        print(auth_resp.text)
-        raise UnauthorizedAccess(config['auth_url'], auth_resp.text)
-    auth_json = auth_resp.json()
+    auth_json = _fetch_token_info(token)
     if len(roles):
         check_roles(required=roles, given=auth_json['customroles'], auth_url=config['auth_url'])
 
@@ -46,9 +59,10 @@ def get_auth_header():
     return flask.request.headers.get('Authorization', '').replace('Bearer', '').strip()
 
 
+@cachetools.cached(_WORKSPACE_IDS_CACHE, key=_hash_token, lock=threading.Lock())
 def get_workspace_ids(auth_token):
     """Get a list of workspace IDs that the given username is allowed to access in
-    the workspace."""
+    the workspace. Results are cached for a short time."""
     if not auth_token:
         return []  # anonymous users
     config = get_config()
@@ -60,7 +74,7 @@ def get_workspace_ids(auth_token):
         'params': [{'perm': 'r'}]
     }
     headers = {'Authorization': auth_token}
-    resp = requests.post(
+    resp = _SESSION.post(
         ws_url,
         data=json.dumps(payload),
         headers=headers
@@ -68,3 +82,20 @@ def get_workspace_ids(auth_token):
     if not resp.ok:
         raise UnauthorizedAccess(ws_url, resp.text)
     return resp.json()['result'][0]['workspaces']
+
+
+@cachetools.cached(_TOKEN_CACHE, key=_hash_token, lock=threading.Lock())
+def _fetch_token_info(token):
+    """
+    Make an authorization request to the kbase auth2 server.
+    Failed lookups raise an exception and are not cached.
+    """
+    config = get_config()
+    headers = {'Authorization': token}
+    auth_url = config['auth_url'] + '/api/V2/me'
+    auth_resp = _SESSION.get(auth_url, headers=headers)
+    if not auth_resp.ok:
+        print('-' * 80)
+        print(auth_resp.text)
+        raise UnauthorizedAccess(config['auth_url'], auth_resp.text)
+    return auth_resp.json()
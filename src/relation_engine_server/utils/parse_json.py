@@ -1,5 +1,5 @@
-import json
 import flask
+import orjson
 
 
 def get_json_body():
@@ -10,5 +10,5 @@ def get_json_body():
     json_body = None  # type: ignore
     req_data = flask.request.get_data()
     if req_data:
-        json_body = json.loads(req_data)
+        json_body = orjson.loads(req_data)
     return json_body
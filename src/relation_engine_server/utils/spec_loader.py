@@ -7,6 +7,12 @@ import yaml
 
 from .config import get_config
 
+try:
+    # Use the much faster libyaml parser, if it is available
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader  # type: ignore
+
 _CONF = get_config()
 
 
@@ -33,7 +39,7 @@ def get_schema(name):
     except IndexError:
         raise SchemaNonexistent(name)
     with open(path) as fd:
-        return yaml.safe_load(fd)
+        return yaml.load(fd, Loader=SafeLoader)
 
 
 def get_schema_for_doc(doc_id):
@@ -50,7 +56,18 @@ def get_stored_query(name):
     except IndexError:
         raise StoredQueryNonexistent(name)
     with open(path) as fd:
-        return yaml.safe_load(fd)
+        return yaml.load(fd, Loader=SafeLoader)
+
+
+def get_spec_version():
+    """
+    Get an identifier for the spec release currently on disk. The spec directory is
+    recreated whenever a release is downloaded, so its modification time changes.
+    """
+    try:
+        return os.stat(_CONF['spec_paths']['root']).st_mtime_ns
+    except FileNotFoundError:
+        return None
 
 
 def _find_paths(dir_path, file_pattern):
@@ -5,6 +5,7 @@ We make actual ajax requests to the running docker container.
 """
 import unittest
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
 
@@ -16,6 +17,8 @@ _CONF = get_config()
 NON_ADMIN_TOKEN = 'non_admin_token'
 ADMIN_TOKEN = 'admin_token'
 INVALID_TOKEN = 'invalid_token'
+# An admin token that the mock workspace rejects
+ADMIN_NO_WORKSPACE_TOKEN = 'admin_token_no_workspace'
 
 # Use the docker-compose url of the running flask server
 URL = os.environ.get('TEST_URL', 'http://localhost:5000')
@@ -40,14 +43,14 @@ def create_test_edges(count):
     return '\n'.join(doc(i) for i in range(0, count))
 
 
-def save_test_docs(count, edges=False):
+def save_test_docs(session, count, edges=False):
     if edges:
         docs = create_test_edges(count)
         collection = 'test_edge'
     else:
         docs = create_test_docs(count)
         collection = 'test_vertex'
-    return requests.put(
+    return session.put(
         API_URL + '/documents',
         params={'overwrite': True, 'collection': collection},
         data=docs,
@@ -57,16 +60,26 @@ def save_test_docs(count, edges=False):
 
 class TestApi(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        # Reuse connections to the API server across all requests
+        cls.session = requests.Session()
+        cls.session.mount(URL, HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=3))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.session.close()
+
     def test_root(self):
         """Test root path for api."""
-        resp = requests.get(URL + '/').json()
+        resp = self.session.get(URL + '/').json()
         self.assertEqual(resp['arangodb_status'], 'connected_authorized')
         self.assertTrue(resp['commit_hash'])
         self.assertTrue(resp['repo_url'])
 
     def test_config(self):
         """Test config fetch."""
-        resp = requests.get(API_URL + '/config').json()
+        resp = self.session.get(API_URL + '/config').json()
         self.assertTrue(len(resp['auth_url']))
         self.assertTrue(len(resp['workspace_url']))
         self.assertTrue(len(resp['kbase_endpoint']))
@@ -76,7 +89,7 @@ class TestApi(unittest.TestCase):
 
     def test_update_specs(self):
         """Test the endpoint that triggers an update on the specs."""
-        resp = requests.put(
+        resp = self.session.put(
             API_URL + '/specs',
             headers=HEADERS_ADMIN,
             params={'reset': '1', 'init_collections': '1'}
@@ -87,7 +100,7 @@ class TestApi(unittest.TestCase):
         # Test that the indexes get created and not duplicated
         url = _CONF['db_url'] + '/_api/index'
         auth = (_CONF['db_user'], _CONF['db_pass'])
-        resp = requests.get(url, params={'collection': 'ncbi_taxon'}, auth=auth)
+        resp = self.session.get(url, params={'collection': 'ncbi_taxon'}, auth=auth)
         resp_json = resp.json()
         indexes = resp_json['indexes']
         self.assertEqual(len(indexes), 4)
@@ -101,12 +114,12 @@ class TestApi(unittest.TestCase):
 
     def test_list_stored_queries(self):
         """Test the listing out of saved AQL stored queries."""
-        resp = requests.get(API_URL + '/specs/stored_queries').json()
+        resp = self.session.get(API_URL + '/specs/stored_queries').json()
         self.assertTrue('list_test_vertices' in resp)
 
     def test_list_schemas(self):
         """Test the listing out of registered JSON schemas for vertices and edges."""
-        resp = requests.get(API_URL + '/specs/schemas').json()
+        resp = self.session.get(API_URL + '/specs/schemas').json()
         self.assertTrue('test_vertex' in resp)
         self.assertTrue('test_edge' in resp)
         self.assertFalse('error' in resp)
@@ -114,21 +127,21 @@ class TestApi(unittest.TestCase):
 
     def test_fetch_schema_for_doc(self):
         """Given a document ID, fetch its schema."""
-        resp = requests.get(API_URL + '/specs/schemas', params={'doc_id': 'test_vertex/123'}).json()
+        resp = self.session.get(API_URL + '/specs/schemas', params={'doc_id': 'test_vertex/123'}).json()
         self.assertEqual(resp['name'], 'test_vertex')
         self.assertEqual(resp['type'], 'vertex')
         self.assertTrue(resp['schema'])
 
     def test_save_documents_missing_auth(self):
         """Test an invalid attempt to save a doc with a missing auth token."""
-        resp = requests.put(
+        resp = self.session.put(
             API_URL + '/documents?on_duplicate=error&overwrite=true&collection'
         ).json()
         self.assertEqual(resp['error'], {'message': 'Missing header: Authorization', 'status': 400})
 
     def test_save_documents_invalid_auth(self):
         """Test an invalid attempt to save a doc with a bad auth token."""
-        resp = requests.put(
+        resp = self.session.put(
             API_URL + '/documents?on_duplicate=error&overwrite=true&collection',
             headers={'Authorization': 'Bearer ' + INVALID_TOKEN}
         ).json()
@@ -137,7 +150,7 @@ class TestApi(unittest.TestCase):
 
     def test_save_documents_non_admin(self):
         """Test an invalid attempt to save a doc as a non-admin."""
-        resp = requests.put(
+        resp = self.session.put(
             API_URL + '/documents?on_duplicate=error&overwrite=true&collection',
             headers=HEADERS_NON_ADMIN
         ).json()
@@ -146,7 +159,7 @@ class TestApi(unittest.TestCase):
 
     def test_save_documents_invalid_schema(self):
         """Test the case where some documents fail against their schema."""
-        resp = requests.put(
+        resp = self.session.put(
             API_URL + '/documents',
             params={'on_duplicate': 'ignore', 'collection': 'test_vertex'},
             data='{"name": "x"}\n{"name": "y"}',
@@ -159,7 +172,7 @@ class TestApi(unittest.TestCase):
 
     def test_save_documents_missing_schema(self):
         """Test the case where the collection/schema does not exist."""
-        resp = requests.put(
+        resp = self.session.put(
             API_URL + '/documents',
             params={'collection': 'xyzabc'},
             data='',
@@ -169,7 +182,7 @@ class TestApi(unittest.TestCase):
 
     def test_save_documents_invalid_json(self):
         """Test an attempt to save documents with an invalid JSON body."""
-        resp = requests.put(
+        resp = self.session.put(
             API_URL + '/documents',
             params={'collection': 'test_vertex'},
             data='\n',
@@ -181,19 +194,19 @@ class TestApi(unittest.TestCase):
 
     def test_create_documents(self):
         """Test all valid cases for saving documents."""
-        resp = save_test_docs(3)
+        resp = save_test_docs(self.session, 3)
         expected = {'created': 3, 'errors': 0, 'empty': 0, 'updated': 0, 'ignored': 0, 'error': False}
         self.assertEqual(resp, expected)
 
     def test_create_edges(self):
         """Test all valid cases for saving edges."""
-        resp = save_test_docs(3, edges=True)
+        resp = save_test_docs(self.session, 3, edges=True)
         expected = {'created': 3, 'errors': 0, 'empty': 0, 'updated': 0, 'ignored': 0, 'error': False}
         self.assertEqual(resp, expected)
 
     def test_update_documents(self):
         """Test updating existing documents."""
-        resp = requests.put(
+        resp = self.session.put(
             API_URL + '/documents',
             params={'on_duplicate': 'update', 'collection': 'test_vertex'},
             data=create_test_docs(3),
@@ -205,14 +218,14 @@ class TestApi(unittest.TestCase):
     def test_update_edge(self):
         """Test updating existing edge."""
         edges = create_test_edges(3)
-        resp = requests.put(
+        resp = self.session.put(
             API_URL + '/documents',
             params={'on_duplicate': 'update', 'collection': 'test_edge'},
             data=create_test_edges(3),
             headers=HEADERS_ADMIN
         )
         self.assertTrue(resp.ok)
-        resp = requests.put(
+        resp = self.session.put(
             API_URL + '/documents',
             params={'on_duplicate': 'update', 'collection': 'test_edge'},
             data=edges,
@@ -223,7 +236,7 @@ class TestApi(unittest.TestCase):
 
     def test_replace_documents(self):
         """Test replacing of existing documents."""
-        resp = requests.put(
+        resp = self.session.put(
             API_URL + '/documents',
             params={'on_duplicate': 'replace', 'collection': 'test_vertex'},
             data=create_test_docs(3),
@@ -234,8 +247,8 @@ class TestApi(unittest.TestCase):
 
     def test_save_documents_dupe_errors(self):
         """Test where we want to raise errors on duplicate documents."""
-        save_test_docs(3)
-        resp = requests.put(
+        save_test_docs(self.session, 3)
+        resp = self.session.put(
             API_URL + '/documents',
             params={'on_duplicate': 'error', 'collection': 'test_vertex', 'display_errors': '1'},
             data=create_test_docs(3),
@@ -247,7 +260,7 @@ class TestApi(unittest.TestCase):
 
     def test_save_documents_ignore_dupes(self):
         """Test ignoring duplicate, existing documents when saving."""
-        resp = requests.put(
+        resp = self.session.put(
             API_URL + '/documents',
             params={'on_duplicate': 'ignore', 'collection': 'test_vertex'},
             data=create_test_docs(3),
@@ -258,9 +271,9 @@ class TestApi(unittest.TestCase):
 
     def test_admin_query(self):
         """Test an ad-hoc query made by an admin."""
-        save_test_docs(1)
+        save_test_docs(self.session, 1)
         query = 'for v in test_vertex sort rand() limit @count return v._id'
-        resp = requests.post(
+        resp = self.session.post(
             API_URL + '/query_results',
             params={},
             headers=HEADERS_ADMIN,
@@ -272,7 +285,7 @@ class TestApi(unittest.TestCase):
     def test_admin_query_non_admin(self):
         """Test an ad-hoc query error as a non-admin."""
         query = 'for v in test_vertex sort rand() limit @count return v._id'
-        resp = requests.post(
+        resp = self.session.post(
             API_URL + '/query_results',
             params={},
             headers=HEADERS_NON_ADMIN,
@@ -281,10 +294,21 @@ class TestApi(unittest.TestCase):
         self.assertEqual(resp['error']['message'], 'Unauthorized')
         self.assertEqual(resp['error']['status'], 403)
 
+    def test_admin_query_non_string_non_admin(self):
+        """Test that a non-admin gets an auth error, not a server error, for a non-string query."""
+        resp = self.session.post(
+            API_URL + '/query_results',
+            params={},
+            headers=HEADERS_NON_ADMIN,
+            data=json.dumps({'query': 5})
+        ).json()
+        self.assertEqual(resp['error']['message'], 'Unauthorized')
+        self.assertEqual(resp['error']['status'], 403)
+
     def test_admin_query_invalid_auth(self):
         """Test the error response for an ad-hoc admin query without auth."""
         query = 'for v in test_vertex sort rand() limit @count return v._id'
-        resp = requests.post(
+        resp = self.session.post(
             API_URL + '/query_results',
             params={},
             headers={'Authorization': INVALID_TOKEN},
@@ -295,8 +319,8 @@ class TestApi(unittest.TestCase):
 
     def test_query_with_cursor(self):
         """Test getting more data via a query cursor and setting batch size."""
-        save_test_docs(count=20)
-        resp = requests.post(
+        save_test_docs(self.session, count=20)
+        resp = self.session.post(
             API_URL + '/query_results',
             params={'stored_query': 'list_test_vertices', 'batch_size': 10, 'full_count': True}
         ).json()
@@ -306,7 +330,7 @@ class TestApi(unittest.TestCase):
         self.assertEqual(resp['stats']['fullCount'], 20)
         self.assertTrue(len(resp['results']), 10)
         cursor_id = resp['cursor_id']
-        resp = requests.post(
+        resp = self.session.post(
             API_URL + '/query_results',
             params={'cursor_id': cursor_id}
         ).json()
@@ -316,16 +340,61 @@ class TestApi(unittest.TestCase):
         self.assertEqual(resp['cursor_id'], None)
         self.assertTrue(len(resp['results']), 10)
         # Try to get the same cursor again
-        resp = requests.post(
+        resp = self.session.post(
             API_URL + '/query_results',
             params={'cursor_id': cursor_id}
         ).json()
         self.assertTrue(resp['error'])
         self.assertEqual(resp['arango_message'], 'cursor not found')
 
+    def test_query_with_stream(self):
+        """Test a query using a streaming cursor, which does not count its results."""
+        save_test_docs(self.session, count=20)
+        resp = self.session.post(
+            API_URL + '/query_results',
+            params={'stored_query': 'list_test_vertices', 'stream': 1}
+        ).json()
+        self.assertEqual(len(resp['results']), 20)
+        self.assertEqual(resp['count'], None)
+        self.assertEqual(resp['has_more'], False)
+
+    def test_query_stream_full_count(self):
+        """Test that full_count cannot be combined with a streaming cursor."""
+        resp = self.session.post(
+            API_URL + '/query_results',
+            params={'stored_query': 'list_test_vertices', 'stream': 'true', 'full_count': True}
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()['error'], 'full_count cannot be used with a streaming cursor')
+
+    def test_query_batch_size_invalid(self):
+        """Test that a non-integer batch size is rejected."""
+        resp = self.session.post(
+            API_URL + '/query_results',
+            params={'stored_query': 'list_test_vertices', 'batch_size': 'x'}
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()['error'], 'batch_size must be an integer')
+
+    def test_query_batch_size_clamped(self):
+        """Test that out-of-range batch sizes are clamped to the allowed range."""
+        save_test_docs(self.session, count=20)
+        resp = self.session.post(
+            API_URL + '/query_results',
+            params={'stored_query': 'list_test_vertices', 'batch_size': 0}
+        ).json()
+        self.assertEqual(len(resp['results']), 1)
+        self.assertEqual(resp['has_more'], True)
+        resp = self.session.post(
+            API_URL + '/query_results',
+            params={'stored_query': 'list_test_vertices', 'batch_size': 99999}
+        ).json()
+        self.assertEqual(len(resp['results']), 20)
+        self.assertEqual(resp['has_more'], False)
+
     def test_query_no_name(self):
         """Test a query error with a stored query name that does not exist."""
-        resp = requests.post(
+        resp = self.session.post(
             API_URL + '/query_results',
             params={'stored_query': 'nonexistent'}
         ).json()
@@ -334,7 +403,7 @@ class TestApi(unittest.TestCase):
 
     def test_query_missing_bind_var(self):
         """Test a query error with a missing bind variable."""
-        resp = requests.post(
+        resp = self.session.post(
             API_URL + '/query_results',
             params={'stored_query': 'list_test_vertices'},
             data=json.dumps({'xyz': 'test_vertex'})
@@ -346,7 +415,7 @@ class TestApi(unittest.TestCase):
         """Test the case where we query a collection with specific workspace access."""
         ws_id = 3
         # Remove all test vertices and create one with a ws_id
-        requests.put(
+        self.session.put(
             API_URL + '/documents',
             params={'overwrite': True, 'collection': 'test_vertex'},
             data=json.dumps({
@@ -356,7 +425,7 @@ class TestApi(unittest.TestCase):
             }),
             headers=HEADERS_ADMIN
         )
-        resp = requests.post(
+        resp = self.session.post(
             API_URL + '/query_results',
             params={'stored_query': 'list_test_vertices'},
             headers={'Authorization': 'valid_token'}  # see ./mock_workspace/endpoints.json
@@ -367,13 +436,13 @@ class TestApi(unittest.TestCase):
     def test_auth_query_no_access(self):
         """Test the case where we try to query a collection without the right workspace access."""
         # Remove all test vertices and create one with a ws_id
-        requests.put(
+        self.session.put(
             API_URL + '/documents',
             params={'overwrite': True, 'collection': 'test_vertex'},
             data='{"name": "requires_auth", "_key": "1", "ws_id": 9999}',
             headers=HEADERS_ADMIN
         )
-        resp = requests.post(
+        resp = self.session.post(
             API_URL + '/query_results',
             params={'stored_query': 'list_test_vertices'},
             headers={'Authorization': 'valid_token'}  # see ./mock_workspace/endpoints.json
@@ -383,13 +452,13 @@ class TestApi(unittest.TestCase):
     def test_query_cannot_pass_ws_ids(self):
         """Test that users cannot set the ws_ids param."""
         ws_id = 99
-        requests.put(
+        self.session.put(
             API_URL + '/documents',
             params={'overwrite': True, 'collection': 'test_vertex'},
             data='{"name": "requires_auth", "_key": "1", "ws_id": 99}',
             headers=HEADERS_ADMIN
         )
-        resp = requests.post(
+        resp = self.session.post(
             API_URL + '/query_results',
             params={'view': 'list_test_vertices'},
             data=json.dumps({'ws_ids': [ws_id]}),
@@ -399,13 +468,13 @@ class TestApi(unittest.TestCase):
 
     def test_auth_query_invalid_token(self):
         """Test the case where we try to authorize a query using an invalid auth token."""
-        requests.put(
+        self.session.put(
             API_URL + '/documents',
             params={'overwrite': True, 'collection': 'test_vertex'},
             data='{"name": "requires_auth", "_key": "1", "ws_id": 99}',
             headers=HEADERS_ADMIN
         )
-        resp = requests.post(
+        resp = self.session.post(
             API_URL + '/query_results',
             params={'view': 'list_test_vertices'},
             data=json.dumps({'ws_ids': [1]}),
@@ -413,10 +482,22 @@ class TestApi(unittest.TestCase):
         )
         self.assertEqual(resp.status_code, 403)
 
+    def test_public_query_invalid_token(self):
+        """Test that a stored query that does not use ws_ids ignores an invalid auth token."""
+        save_test_docs(self.session, 1)
+        resp = self.session.post(
+            API_URL + '/query_results',
+            params={'stored_query': 'fetch_test_vertex'},
+            data=json.dumps({'key': '0'}),
+            headers={'Authorization': INVALID_TOKEN}
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['count'], 1)
+
     def test_auth_adhoc_query(self):
         """Test that the 'ws_ids' bind-var is set for RE_ADMINs."""
         ws_id = 99
-        requests.put(
+        self.session.put(
             API_URL + '/documents',
             params={'overwrite': True, 'collection': 'test_vertex'},
             data=json.dumps({'name': 'requires_auth', 'key': '1', 'ws_id': ws_id}),
@@ -424,17 +505,29 @@ class TestApi(unittest.TestCase):
         )
         # This is the same query as list_test_vertices.aql in the spec
         query = 'for o in test_vertex filter o.is_public || o.ws_id IN ws_ids return o'
-        resp = requests.post(
+        resp = self.session.post(
             API_URL + '/query_results',
             data=json.dumps({'query': query}),
             headers={'Authorization': ADMIN_TOKEN}  # see ./mock_workspace/endpoints.json
         ).json()
         self.assertEqual(resp['count'], 1)
 
+    def test_auth_adhoc_query_workspace_error(self):
+        """Test that a failed workspace lookup for an admin's ad-hoc query is an auth error."""
+        query = 'for o in test_vertex filter o.is_public || o.ws_id IN ws_ids return o'
+        # see ./mock_workspace/list_workspace_ids_admin_no_workspace.json
+        resp = self.session.post(
+            API_URL + '/query_results',
+            data=json.dumps({'query': query}),
+            headers={'Authorization': ADMIN_NO_WORKSPACE_TOKEN}
+        )
+        self.assertEqual(resp.status_code, 403)
+        self.assertEqual(resp.json()['error']['message'], 'Unauthorized')
+
     def test_save_docs_invalid(self):
         """Test that an invalid bulk save returns a 400 response"""
         doc = {'_from': '|||', '_to': '|||'}
-        resp = requests.put(
+        resp = self.session.put(
             API_URL + '/documents',
             params={'overwrite': True, 'collection': 'test_edge', 'display_errors': 1},
             data=json.dumps(doc),
@@ -445,14 +538,14 @@ class TestApi(unittest.TestCase):
         self.assertEqual(resp_json['errors'], 1)
 
     def test_list_data_sources(self):
-        resp = requests.get(API_URL + '/data_sources')
+        resp = self.session.get(API_URL + '/data_sources')
         self.assertTrue(resp.ok)
         resp_json = resp.json()
         self.assertTrue(len(resp_json['data_sources']) > 0)
         self.assertEqual(set(type(x) for x in resp_json['data_sources']), {str})
 
     def test_show_data_source(self):
-        resp = requests.get(API_URL + '/data_sources/ncbi_taxonomy')
+        resp = self.session.get(API_URL + '/data_sources/ncbi_taxonomy')
         self.assertTrue(resp.ok)
         resp_json = resp.json()
         self.assertEqual(type(resp_json['data_source']), dict)
@@ -466,7 +559,7 @@ class TestApi(unittest.TestCase):
     def test_show_data_source_unknown(self):
         """Unknown data source name should yield 404 status."""
         name = 'xyzyxz'
-        resp = requests.get(f"{API_URL}/data_sources/{name}")
+        resp = self.session.get(f"{API_URL}/data_sources/{name}")
         self.assertEqual(resp.status_code, 404)
         resp_json = resp.json()
         # Just assert that it returns any json in the body
@@ -1,9 +1,21 @@
 """
 Test utility functions
 """
-from src.relation_engine_server.utils import json_validation
+from src.relation_engine_server.utils import json_validation, auth
+from src.relation_engine_server.utils import arango_client
+from src.relation_engine_server.api_versions import api_v1
+from src.relation_engine_server.exceptions import InvalidParameters, UnauthorizedAccess
 
+import hashlib
 import unittest
+from unittest import mock
+
+
+def _mock_response(ok=True, json_body=None):
+    """Build a stand-in for a requests response."""
+    resp = mock.Mock(ok=ok, text='' if ok else 'Invalid token')
+    resp.json.return_value = json_body
+    return resp
 
 
 class TestUtils(unittest.TestCase):
@@ -14,3 +26,98 @@ class TestUtils(unittest.TestCase):
         obj = {}  # type: dict
         json_validation.Validator(schema).validate(obj)
         self.assertEqual(obj, {'foo': 'bar'})
+
+
+class TestAuthCache(unittest.TestCase):
+
+    def setUp(self):
+        auth._TOKEN_CACHE.clear()
+
+    def test_token_info_cached(self):
+        """Test that a repeat token lookup within the TTL does not call the auth server again."""
+        resp = _mock_response(json_body={'customroles': []})
+        with mock.patch.object(auth._SESSION, 'get', return_value=resp) as get:
+            self.assertEqual(auth._fetch_token_info('token'), {'customroles': []})
+            self.assertEqual(auth._fetch_token_info('token'), {'customroles': []})
+        self.assertEqual(get.call_count, 1)
+
+    def test_token_info_failure_not_cached(self):
+        """Test that a failed token lookup is not cached and raises every time."""
+        resp = _mock_response(ok=False)
+        with mock.patch.object(auth._SESSION, 'get', return_value=resp) as get:
+            with self.assertRaises(UnauthorizedAccess):
+                auth._fetch_token_info('token')
+            with self.assertRaises(UnauthorizedAccess):
+                auth._fetch_token_info('token')
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(len(auth._TOKEN_CACHE), 0)
+
+    def test_token_cache_key_is_hashed(self):
+        """Test that the token cache is keyed on a digest of the token, not the raw token."""
+        resp = _mock_response(json_body={'customroles': []})
+        with mock.patch.object(auth._SESSION, 'get', return_value=resp):
+            auth._fetch_token_info('token')
+        digest = hashlib.blake2b(b'token', digest_size=16).digest()
+        self.assertEqual(list(auth._TOKEN_CACHE.keys()), [digest])
+        self.assertNotIn('token', auth._TOKEN_CACHE)
+
+
+class TestWorkspaceIdsCache(unittest.TestCase):
+
+    def setUp(self):
+        auth._WORKSPACE_IDS_CACHE.clear()
+
+    def test_workspace_ids_cached(self):
+        """Test that a repeat workspace ID lookup within the TTL does not call the workspace again."""
+        resp = _mock_response(json_body={'result': [{'workspaces': [1, 2]}]})
+        with mock.patch.object(auth._SESSION, 'post', return_value=resp) as post:
+            self.assertEqual(auth.get_workspace_ids('token'), [1, 2])
+            self.assertEqual(auth.get_workspace_ids('token'), [1, 2])
+        self.assertEqual(post.call_count, 1)
+
+    def test_workspace_ids_failure_not_cached(self):
+        """Test that a failed workspace ID lookup is not cached and raises every time."""
+        resp = _mock_response(ok=False)
+        with mock.patch.object(auth._SESSION, 'post', return_value=resp) as post:
+            with self.assertRaises(UnauthorizedAccess):
+                auth.get_workspace_ids('token')
+            with self.assertRaises(UnauthorizedAccess):
+                auth.get_workspace_ids('token')
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(len(auth._WORKSPACE_IDS_CACHE), 0)
+
+    def test_workspace_ids_anonymous(self):
+        """Test that anonymous users get no workspace IDs without calling the workspace."""
+        with mock.patch.object(auth._SESSION, 'post') as post:
+            self.assertEqual(auth.get_workspace_ids(''), [])
+        post.assert_not_called()
+
+
+class TestBatchSize(unittest.TestCase):
+
+    def test_batch_size_default(self):
+        """Test that the default batch size is used when none is passed."""
+        self.assertEqual(api_v1._get_batch_size({}, 100), 100)
+        self.assertEqual(api_v1._get_batch_size({'batch_size': ''}, 100), 100)
+
+    def test_batch_size_clamped(self):
+        """Test that the batch size is clamped between 1 and the maximum."""
+        self.assertEqual(api_v1._get_batch_size({'batch_size': '10'}, 100), 10)
+        self.assertEqual(api_v1._get_batch_size({'batch_size': '0'}, 100), 1)
+        self.assertEqual(api_v1._get_batch_size({'batch_size': '-5'}, 100), 1)
+        max_size = arango_client.MAX_BATCH_SIZE
+        self.assertEqual(api_v1._get_batch_size({'batch_size': str(max_size + 1)}, 100), max_size)
+
+    def test_batch_size_invalid(self):
+        """Test that a non-integer batch size is rejected."""
+        with self.assertRaises(InvalidParameters):
+            api_v1._get_batch_size({'batch_size': 'x'}, 100)
+
+    def test_default_batch_size_invalid(self):
+        """Test that a stored query with a bad default_batch_size fails to compile."""
+        for default_batch_size in ('100', 0, True):
+            stored_query = {'query': 'return 1', 'default_batch_size': default_batch_size}
+            with mock.patch.object(api_v1.spec_loader, 'get_stored_query', return_value=stored_query):
+                with self.assertRaises(ValueError):
+                    # Use a spec version of our own so that no cached compilation is returned
+                    api_v1._compile_stored_query('bad_batch_size', 'test_' + repr(default_batch_size))